@@ -1,5 +1,10 @@
 import os
+import sys
 import json
+import asyncio
+import io
+import importlib.util
+import subprocess
 import traceback  # Import traceback module
 
 # Authenticate with Google API Key (Colab-compatible)
@@ -21,21 +26,40 @@ except Exception as e:
     print(f"🔑 Authentication Error: {e}")
     raise
 
-# Install required packages (run this in a separate cell if needed)
-!pip install google-adk google-generativeai
+# Install required packages only if they are missing (pip is skipped on provisioned environments)
+# aiosqlite: async SQLite driver, pypdfium2/pdfplumber: PDF parsing,
+# numpy: semantic cache, orjson: JSON parsing
+REQUIRED_PACKAGES = [
+    ("google-adk", "google.adk"),
+    ("google-generativeai", "google.generativeai"),
+    ("aiosqlite", "aiosqlite"),
+    ("pypdfium2", "pypdfium2"),
+    ("pdfplumber", "pdfplumber"),
+    ("numpy", "numpy"),
+    ("orjson", "orjson"),
+]
+for pkg, mod in REQUIRED_PACKAGES:
+    try:
+        spec = importlib.util.find_spec(mod)
+    except ModuleNotFoundError:  # Parent package (e.g. google) is missing
+        spec = None
+    if spec is None:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-q", pkg])
+        importlib.invalidate_caches()  # Let this process see the new package
 
-# Install aiosqlite for async SQLite driver and pdfplumber for PDF parsing
-!pip install aiosqlite pdfplumber
+import orjson
 
 # Import ADK components
 from typing import Any, Dict
 from google.adk.agents import Agent, LlmAgent
 from google.adk.apps.app import App, EventsCompactionConfig
 from google.adk.models.google_llm import Gemini
-from google.adk.sessions import DatabaseSessionService
+from google.adk.sessions import DatabaseSessionService, InMemorySessionService
 from google.adk.runners import Runner
 from google.adk.tools.tool_context import ToolContext
 from google.genai import types
+import httpx
+from sqlalchemy import event as sa_event
 
 # Additional import and configuration as per Gemini API docs
 import google.generativeai as genai
@@ -51,7 +75,28 @@ retry_config = types.HttpRetryOptions(
     http_status_codes=[429, 500, 503, 504],
 )
 
+# Timeout for each Gemini HTTP request, so a stalled attempt ends instead of
+# hanging the turn. This is an estimate, not a measured median: it leaves room
+# for a long batched gemini-pro-latest reply; tune it to ~1.5x the latency you
+# observe for MODEL_NAME. Timed-out requests are re-issued up to
+# LLM_TIMEOUT_ATTEMPTS times in total (retry_config only covers status codes).
+LLM_TIMEOUT_SECONDS = 60.0
+LLM_TIMEOUT_ATTEMPTS = 3
+
 # Helper Functions (async) - Keeping this for general use, but demo will use inline calls
+async def ensure_session(app_name: str, user_id: str, session_id: str):
+    """
+    Returns the existing session, creating it only if it does not exist yet.
+    """
+    session = await session_service.get_session(
+        app_name=app_name, user_id=user_id, session_id=session_id
+    )
+    if session is None:
+        session = await session_service.create_session(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+    return session
+
 async def run_session(
     runner_instance: Runner,
     user_queries: list[str] | str = None,
@@ -59,15 +104,7 @@ async def run_session(
 ):
     print(f"\n### Session: {session_name}")
     app_name = runner_instance.app_name
-    try:
-        session = await session_service.create_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
-    except Exception as e:
-        print(f"Session creation error: {e}")
-        session = await session_service.get_session(
-            app_name=app_name, user_id=USER_ID, session_id=session_name
-        )
+    session = await ensure_session(app_name, USER_ID, session_name)
     if user_queries:
         if isinstance(user_queries, str):
             user_queries = [user_queries]
@@ -91,23 +128,31 @@ async def run_session(
 
 print("✅ Helper functions defined.")
 
+# Semantic cache for candidate extraction (stored alongside resume_sessions.db)
+from cache import SemanticCache, embed_text
+extraction_cache = SemanticCache("resume_cache.db")
+
 # Define Custom Tools for Session State
+# Interned state keys, so their hashes are computed once and reused
+_K_NAME = sys.intern("user:name")
+_K_ROLES = sys.intern("user:preferred_roles")
+
 def save_userinfo(
     tool_context: ToolContext, user_name: str, preferred_roles: str
 ) -> Dict[str, Any]:
     """
     Tool to save user name and preferred job roles in session state.
     """
-    tool_context.state["user:name"] = user_name
-    tool_context.state["user:preferred_roles"] = preferred_roles
+    tool_context.state[_K_NAME] = user_name
+    tool_context.state[_K_ROLES] = preferred_roles
     return {"status": "success"}
 
 def retrieve_userinfo(tool_context: ToolContext) -> Dict[str, Any]:
     """
     Tool to retrieve user info from session state.
     """
-    user_name = tool_context.state.get("user:name", "Not provided")
-    preferred_roles = tool_context.state.get("user:preferred_roles", "Not specified")
+    user_name = tool_context.state.get(_K_NAME, "Not provided")
+    preferred_roles = tool_context.state.get(_K_ROLES, "Not specified")
     return {"user_name": user_name, "preferred_roles": preferred_roles}
 
 def extract_candidate_info(
@@ -117,6 +162,16 @@ def extract_candidate_info(
     Extracts key information from a resume, including name, graduation details,
     skills, and certifications.
     """
+    # Reuse a previous extraction for identical or near-identical resumes;
+    # cache errors (e.g. an embedding 429) are treated as a miss
+    try:
+        cached_info = extraction_cache.get(resume_text)
+    except Exception as e:
+        print(f"Extraction cache lookup failed: {e}")
+        cached_info = None
+    if cached_info is not None:
+        return cached_info
+
     # This is a simplified extraction; a real-world tool might use a more complex
     # LLM call or regex patterns to be more robust.
     prompt = f"""Extract the following information from the resume text:
@@ -134,16 +189,22 @@ Resume Text:
     response = tool_context.model.generate_content(prompt)
     try:
         # Attempt to parse the response as JSON
-        extracted_info = json.loads(response.text)
-    except json.JSONDecodeError:
+        extracted_info = orjson.loads(response.text)
+    except json.JSONDecodeError:  # orjson.JSONDecodeError is a subclass
         # Fallback if the LLM doesn't return perfect JSON
-        extracted_info = {
+        return {
             "name": "N/A",
             "graduation": "N/A",
             "skills": "N/A",
             "certifications": "N/A",
             "raw_response": response.text  # Keep raw response for debugging
         }
+
+    # A failed store only skips caching; the extraction itself succeeded
+    try:
+        extraction_cache.put(resume_text, extracted_info)
+    except Exception as e:
+        print(f"Extraction cache store failed: {e}")
     return extracted_info
 
 print("✅ Tools created.")
@@ -152,10 +213,49 @@ print("✅ Tools created.")
 APP_NAME = "resume_screener_app"
 USER_ID = "default_user"
 MODEL_NAME = "gemini-pro-latest"  # Changed model name to 'gemini-pro-latest'
+# Resume/job cosine similarity below which the Gemini match check is skipped.
+# A rejected resume still gets one (shorter) feedback call, so the gate does not
+# remove a Gemini round trip; it makes clear non-matches deterministic and costs
+# two embedding calls. 0.55 is an untuned starting point, not a calibrated value;
+# a threshold that is too high silently rejects real matches, so calibrate it on
+# labelled resume/job pairs and override it with MATCH_SIMILARITY_THRESHOLD
+# (<= 0 disables the gate, including the embedding calls).
+MATCH_SIMILARITY_THRESHOLD = float(os.environ.get("MATCH_SIMILARITY_THRESHOLD", "0.55"))
+
+class TimeoutRetryGemini(Gemini):
+    """
+    Gemini model that re-issues a model request whose HTTP call timed out.
+    Retrying the single model call (not the whole Runner turn) keeps the
+    session free of duplicate user events.
+    """
+
+    async def generate_content_async(self, llm_request, stream=False):
+        for attempt in range(1, LLM_TIMEOUT_ATTEMPTS + 1):
+            yielded = False
+            try:
+                async for response in super().generate_content_async(
+                    llm_request, stream=stream
+                ):
+                    yielded = True
+                    yield response
+                return
+            except httpx.TimeoutException:
+                print(
+                    f"[LLM] attempt={attempt}/{LLM_TIMEOUT_ATTEMPTS} status=timeout "
+                    f"after {LLM_TIMEOUT_SECONDS}s"
+                )
+                # A partially streamed reply cannot be replayed safely
+                if yielded or attempt == LLM_TIMEOUT_ATTEMPTS:
+                    raise
 
 # Create the agent
 resume_agent = LlmAgent(
-    model=Gemini(model=MODEL_NAME, retry_options=retry_config),
+    model=TimeoutRetryGemini(model=MODEL_NAME, retry_options=retry_config),
+    # Per-request HTTP timeout (milliseconds); status-code retries follow
+    # retry_config, timeouts are retried by TimeoutRetryGemini
+    generate_content_config=types.GenerateContentConfig(
+        http_options=types.HttpOptions(timeout=int(LLM_TIMEOUT_SECONDS * 1000)),
+    ),
     name="resume_screener",
     description="""
 A resume screening assistant. Check if the resume matches the job requirements. Respond clearly with 'Match: Yes' or 'Match: No'. If yes, provide a clean summary of the candidate details (name, graduation, skills, certifications) in a structured format. If no, just say 'You are not matched'.
@@ -173,12 +273,100 @@ resume_app = App(
 
 # Persistent Sessions
 db_url = "sqlite+aiosqlite:///resume_sessions.db"  # Modified to use aiosqlite
-session_service = DatabaseSessionService(db_url=db_url)
+
+# SQLite tuning applied once per pooled connection
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",  # ~20 MB page cache per connection
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",  # Serve reads from a 256 MB memory map
+    "PRAGMA wal_autocheckpoint=1000",
+)
+
+def _configure_sqlite_connection(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+# The single-user demo keeps sessions in memory; set PERSIST=1 to store them in SQLite
+if os.environ.get("PERSIST"):
+    # Keep a pool of long-lived aiosqlite connections so each session call
+    # reuses a warm connection (and its page cache) instead of reconnecting
+    session_service = DatabaseSessionService(
+        db_url=db_url,
+        pool_size=8,
+        # Replace connections once they are 5 minutes old (busy or not). SQLAlchemy
+        # limits connection age, not idle time, so there is no exact idle_timeout
+        pool_recycle=300,
+    )
+    sa_event.listen(
+        session_service.db_engine.sync_engine, "connect", _configure_sqlite_connection
+    )
+    print("✅ Using persistent SQLite sessions.")
+else:
+    session_service = InMemorySessionService()
+    print("✅ Using in-memory sessions (set PERSIST=1 to persist).")
 
 # Runner
 runner = Runner(app=resume_app, session_service=session_service)
 
-print("✅ Resume Screening Agent initialized with persistence and compaction!")
+# Warm up the Gemini connection (TLS + HTTP/2) in the background with a
+# metadata lookup on the agent's own google.genai client: no generate call and
+# no session. files.upload() blocks the loop, so in Colab this runs once the
+# demo reaches its first await; the demo awaits it before its first Runner call
+# so that call reuses the warmed connection.
+async def _warmup():
+    try:
+        await resume_agent.model.api_client.aio.models.get(model=MODEL_NAME)
+    except Exception as e:
+        print(f"Warm-up skipped: {e}")
+
+try:
+    _warmup_task = asyncio.get_running_loop().create_task(_warmup())
+except RuntimeError:
+    _warmup_task = None  # No running loop (plain script); skip the warm-up
+
+print(
+    "✅ Resume Screening Agent initialized with "
+    f"{'persistent' if os.environ.get('PERSIST') else 'in-memory'} sessions!"
+)
+
+# PDF text extraction (called via asyncio.to_thread from the demo)
+def _extract_pdf_text(data: bytes) -> str:
+    try:
+        import pypdfium2 as pdfium
+    except ImportError:
+        # Fall back to pdfplumber if pypdfium2 is not available
+        import pdfplumber
+        with pdfplumber.open(io.BytesIO(data)) as pdf:
+            return "\n".join(page.extract_text() or "" for page in pdf.pages)
+
+    pdf = pdfium.PdfDocument(data)
+    try:
+        return "\n".join(page.get_textpage().get_text_range() for page in pdf)
+    finally:
+        pdf.close()
+
+# Demo prompts: the static text is built once; only the job/resume are filled in per run
+_SCREENING_QUERY = """Answer all of the following in a single reply.
+1. Hi. I prefer roles in AI and data science.
+2. Check if the resume matches the job requirements. Respond with 'Match: Yes' or 'Match: No'. If yes, provide a clean summary of the candidate details (name, graduation, skills, certifications) in a structured format. If no, just say 'You are not matched'.
+3. What was my preferred role? Can you suggest improvements?
+
+Reply only with a JSON object with keys: 'preference_ack', 'match', 'summary', 'improvements'."""
+
+_SCREENING_TEMPLATE = _SCREENING_QUERY + "\n\nJob requirements: {job}\n\nResume: {resume}"
+
+# Used when the embedding gate rejects the resume: no match check, only feedback
+_FEEDBACK_QUERY = """The resume has already been screened as not matching the job requirements. Do not check whether it matches; answer all of the following in a single reply.
+1. Hi. I prefer roles in AI and data science.
+2. What was my preferred role? Can you suggest improvements to this resume for the job requirements?
+
+Reply only with a JSON object with keys: 'preference_ack', 'improvements'."""
+
+_FEEDBACK_TEMPLATE = _FEEDBACK_QUERY + "\n\nJob requirements: {job}\n\nResume: {resume}"
 
 # Demo Function (async wrapper) with manual resume upload
 async def demo_resume_screener():
@@ -194,18 +382,25 @@ async def demo_resume_screener():
         # Handle different file types
         if file_name.lower().endswith('.pdf'):
             try:
-                import pdfplumber
-                with pdfplumber.open(file_name) as pdf:
-                    sample_resume = ""
-                    for page in pdf.pages:
-                        sample_resume += page.extract_text() + "\n"
+                # Parse the uploaded bytes in memory on a worker thread so
+                # other coroutines keep running
+                sample_resume = await asyncio.to_thread(
+                    _extract_pdf_text, uploaded[file_name]
+                )
                 print("✅ PDF resume processed successfully.")
             except ImportError:
-                print("pdfplumber not installed. Falling back to default resume. Install with `!pip install pdfplumber`")
+                print("pypdfium2 and pdfplumber not installed. Falling back to default resume. Install with `!pip install pypdfium2`")
                 print("Using default sample resume.")
         else:  # Assume it's a text file
-            with open(file_name, 'r') as f:
-                sample_resume = f.read()
+            # Read the whole file in one syscall and decode once
+            fd = os.open(file_name, os.O_RDONLY)
+            try:
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                data = os.read(fd, os.fstat(fd).st_size)
+                sample_resume = data.decode("utf-8", "replace")
+            finally:
+                os.close(fd)
             print("✅ Text resume uploaded and read successfully.")
 
     except ImportError:
@@ -240,44 +435,78 @@ async def demo_resume_screener():
 
     session_id = "resume_screening_session_02"
     print(f"\n### Session: {session_id}")
-    try:
-        session = await session_service.create_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
-        )
-    except Exception as e:
-        print(f"Session creation error: {e}")
-        session = await session_service.get_session(
-            app_name=APP_NAME, user_id=USER_ID, session_id=session_id
-        )
+    session = await ensure_session(APP_NAME, USER_ID, session_id)
 
     # Helper to run a single query and print response
     async def run_single_query(query_text: str):
         print(f"\nUser > {query_text}")
         query = types.Content(role="user", parts=[types.Part(text=query_text)])
-        assistant_response = ""
+        chunks = []
         try:
             async for event in runner.run_async(
                 user_id=USER_ID, session_id=session.id, new_message=query
             ):
                 if event.content and event.content.parts:
-                    text = event.content.parts[0].text
-                    if text and text != "None":
-                        print(f"Assistant > {text}")
-                        assistant_response += text
+                    # Stream every text part of the event, not just the first
+                    for part in event.content.parts:
+                        text = part.text
+                        if text and text != "None":
+                            sys.stdout.write(f"Assistant > {text}\n")
+                            chunks.append(text)
+                    sys.stdout.flush()
         except Exception as e:
             print(f"Error during query processing: {e}")
             traceback.print_exc()
-        return assistant_response.strip()
+        return "".join(chunks).strip()
 
-    # Query 1: User preference
-    await run_single_query("Hi. I prefer roles in AI and data science.")
+    # Local embedding gate: clear non-matches skip the Gemini match check. The two
+    # embedding calls are blocking network requests, so run them off the loop.
+    similarity = 1.0
+    if MATCH_SIMILARITY_THRESHOLD > 0:
+        try:
+            resume_vector, job_vector = await asyncio.gather(
+                asyncio.to_thread(embed_text, sample_resume),
+                asyncio.to_thread(embed_text, sample_job),
+            )
+            similarity = float(resume_vector @ job_vector)
+        except Exception as e:
+            print(f"Embedding gate unavailable ({e}); sending the resume to Gemini.")
+
+    # Let the connection warm-up finish so the Runner call below reuses it
+    if _warmup_task is not None:
+        await _warmup_task
+
+    gated_fields = {}
+    if similarity < MATCH_SIMILARITY_THRESHOLD:
+        # Rejected without an LLM match check; still answer the preference and
+        # improvements questions, which matter most to a rejected candidate
+        print(f"\nMatch: No (similarity {similarity:.2f})")
+        print("You are not matched")
+        gated_fields = {"match": "Match: No", "summary": "You are not matched"}
+        screening_response = await run_single_query(
+            _FEEDBACK_TEMPLATE.format(job=sample_job, resume=sample_resume)
+        )
+    else:
+        # Single batched query: preference, match + summary and improvements in one call
+        screening_response = await run_single_query(
+            _SCREENING_TEMPLATE.format(job=sample_job, resume=sample_resume)
+        )
 
-    # Modified Query: Check match and provide summary or rejection in clear format
-    match_query = f"Check if this resume matches the job requirements: {sample_job}. Respond with 'Match: Yes' or 'Match: No'. If yes, provide a clean summary of the candidate details (name, graduation, skills, certifications) in a structured format. If no, just say 'You are not matched'.\n\nResume: {sample_resume}"
-    await run_single_query(match_query)
+    try:
+        # Strip a Markdown code fence if the model wrapped its JSON in one
+        screening_json = screening_response.strip("`").removeprefix("json").strip()
+        screening = json.loads(screening_json)
+    except json.JSONDecodeError:
+        screening = None
+    if isinstance(screening, dict):
+        screening = {**screening, **gated_fields}
+        print("\nPreference >", screening.get("preference_ack", "N/A"))
+        print("Match >", screening.get("match", "N/A"))
+        print("Summary >", screening.get("summary", "N/A"))
+        print("Improvements >", screening.get("improvements", "N/A"))
+    else:
+        print("Could not parse the screening response as a JSON object; raw response shown above.")
 
-    # Query 3: Preferred role & improvements (unchanged)
-    await run_single_query("What was my preferred role? Can you suggest improvements?")
 
     # Verify persistence and state
     try:
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import google.generativeai as genai
+
+EMBEDDING_MODEL = "models/text-embedding-004"
+# Similar resumes (same role or template) from different candidates can clear
+# this threshold, so a semantic hit is only reused when the cached candidate
+# name also appears in the new resume; otherwise it is treated as a miss.
+SIMILARITY_THRESHOLD = 0.92
+
+
+def resume_digest(text: str) -> str:
+    """
+    SHA-256 of the resume text, used as the exact-match cache key.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+_EMBEDDING_CACHE_SIZE = 1024
+_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+
+def embed_text(text: str, digest: Optional[str] = None) -> np.ndarray:
+    """
+    Returns the normalized embedding of `text`. Embeddings are kept in an
+    in-process LRU keyed by the SHA-256 digest, so byte-identical inputs skip
+    the embedding call without the cache holding on to the full text.
+    """
+    digest = digest or resume_digest(text)
+    with _embedding_cache_lock:
+        vector = _embedding_cache.get(digest)
+        if vector is not None:
+            _embedding_cache.move_to_end(digest)
+            return vector
+
+    result = genai.embed_content(model=EMBEDDING_MODEL, content=text)
+    vector = np.asarray(result["embedding"], dtype=np.float32)
+    vector /= np.linalg.norm(vector)  # Unit length, so cosine is a dot product
+    vector.setflags(write=False)
+
+    with _embedding_cache_lock:
+        _embedding_cache[digest] = vector
+        if len(_embedding_cache) > _EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    return vector
+
+
+def _identity_matches(extracted_info: Dict[str, Any], resume_text: str) -> bool:
+    """
+    True if the cached candidate name occurs in `resume_text`.
+    """
+    name = extracted_info.get("name")
+    if not isinstance(name, str) or not name.strip() or name == "N/A":
+        return False
+    return name.strip().lower() in resume_text.lower()
+
+
+def quantize(vector: np.ndarray) -> Tuple[np.ndarray, float]:
+    """
+    Symmetric int8 quantization with a per-vector scale.
+    """
+    scale = float(np.abs(vector).max()) / 127 or 1.0
+    return np.round(vector / scale).astype(np.int8), scale
+
+
+class SemanticCache:
+    """
+    On-disk cache of extracted candidate info, keyed by resume embedding.
+    Exact re-uploads are matched by digest; paraphrased resumes are matched
+    by cosine similarity against previously seen resumes, but only for the
+    same candidate name.
+    """
+
+    def __init__(
+        self, db_path: str = "resume_cache.db", threshold: float = SIMILARITY_THRESHOLD
+    ):
+        self.threshold = threshold
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute(
+            """CREATE TABLE IF NOT EXISTS resume_cache (
+                digest TEXT PRIMARY KEY,
+                embedding BLOB NOT NULL,
+                scale REAL NOT NULL,
+                extracted_info TEXT NOT NULL
+            )"""
+        )
+        self.conn.commit()
+
+    def get(self, resume_text: str) -> Optional[Dict[str, Any]]:
+        digest = resume_digest(resume_text)
+        row = self.conn.execute(
+            "SELECT extracted_info FROM resume_cache WHERE digest = ?", (digest,)
+        ).fetchone()
+        if row:
+            return json.loads(row[0])
+
+        rows = self.conn.execute(
+            "SELECT embedding, scale, extracted_info FROM resume_cache"
+        ).fetchall()
+        if not rows:
+            return None
+        query_q, query_scale = quantize(embed_text(resume_text, digest))
+        matrix = np.frombuffer(
+            b"".join(r[0] for r in rows), dtype=np.int8
+        ).reshape(len(rows), -1)
+        scales = np.fromiter((r[1] for r in rows), dtype=np.float32, count=len(rows))
+        # Integer dot products, rescaled back to cosine similarity
+        scores = (matrix.astype(np.int32) @ query_q.astype(np.int32)) * (query_scale * scales)
+        best = int(np.argpartition(scores, -1)[-1])
+        if scores[best] >= self.threshold:
+            extracted_info = json.loads(rows[best][2])
+            if _identity_matches(extracted_info, resume_text):
+                return extracted_info
+        return None
+
+    def put(self, resume_text: str, extracted_info: Dict[str, Any]) -> None:
+        digest = resume_digest(resume_text)
+        embedding, scale = quantize(embed_text(resume_text, digest))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO resume_cache VALUES (?, ?, ?, ?)",
+            (
+                digest,
+                embedding.tobytes(),
+                scale,
+                json.dumps(extracted_info),
+            ),
+        )
+        self.conn.commit()